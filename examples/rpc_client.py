@@ -2,38 +2,73 @@
 # -*- coding: utf-8 -*-
 """Example RPC client for controlling a wotabag.
 
-Requires tinrypc[httpclient] (https://github.com/mbr/tinyrpc).
+Requires tinrypc[httpclient] (https://github.com/mbr/tinyrpc) and gevent.
 
 """
 
-import time
+from gevent import monkey
+monkey.patch_all()
 
-from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
-from tinyrpc.transports.http import HttpPostClientTransport
-from tinyrpc import RPCClient
+import gevent  # noqa: E402
 
-rpc_client = RPCClient(
-    JSONRPCProtocol(),
-    HttpPostClientTransport('http://raspberrypi.local:60715/')
-)
+import requests  # noqa: E402
+from requests.adapters import HTTPAdapter  # noqa: E402
+
+from tinyrpc.protocols.jsonrpc import JSONRPCErrorResponse, JSONRPCProtocol  # noqa: E402
+from tinyrpc.transports.http import HttpPostClientTransport  # noqa: E402
+from tinyrpc import RPCClient  # noqa: E402
+
+# Share a pool of keep-alive HTTP connections between all RPC calls, rather
+# than opening a new connection for each request. requests is backed by a
+# urllib3 PoolManager, so concurrent callers each get their own connection
+# from the pool (up to pool_maxsize) instead of serializing on one.
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=8, pool_block=False, max_retries=0))
+
+protocol = JSONRPCProtocol()
+transport = HttpPostClientTransport('http://raspberrypi.local:60715/', post_method=session.post)
+rpc_client = RPCClient(protocol, transport)
 
 server = rpc_client.get_proxy(prefix='wotabag.')
 
-# Retrieve server status
-result = server.get_status()
-print(result)
+# Retrieve server status and playlist and start playback. None of these calls
+# depend on each other, so send them to the server as a single JSON-RPC batch
+# request (one round trip instead of three). The LED test pattern
+# (server.test_pattern()) is not part of the batch, since starting playback
+# cancels it.
+status_req = protocol.create_request('wotabag.get_status')
+playlist_req = protocol.create_request('wotabag.get_playlist')
+batch_requests = [
+    status_req,
+    playlist_req,
+    protocol.create_request('wotabag.play'),
+]
+batch = protocol.create_batch_request(batch_requests)
+replies = protocol.parse_reply(transport.send_message(batch.serialize()))
+results = {reply.unique_id: reply for reply in replies}
+
+# Any call in the batch may fail on its own (e.g. play with an empty playlist)
+for request in batch_requests:
+    reply = results.get(request.unique_id)
+    if reply is None:
+        print('{}: no reply'.format(request.method))
+    elif isinstance(reply, JSONRPCErrorResponse):
+        print('{} failed: {}'.format(request.method, reply.error))
+    elif request in (status_req, playlist_req):
+        print(reply.result)
 
-# Retrieve server playlist
-result = server.get_playlist()
-print(result)
 
-# Test LED patterns
-server.test_pattern()
+def poll_status(interval=2):
+    """Periodically print server status during playback."""
+    while True:
+        print(server.get_status())
+        gevent.sleep(interval)
 
-# Start playback
-server.play()
 
-time.sleep(10)
+# Poll status concurrently while playback runs
+poller = gevent.spawn(poll_status)
+gevent.sleep(10)
+poller.kill()
 
 # # Stop playback
 server.stop()
@@ -26,16 +26,45 @@ GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE = 'org.bluez.GattDescriptor1'
 
 
+# BlueZ managed objects, keyed by bus unique name.
+# Entries are dropped whenever BlueZ adds or removes an object.
+_managed_objects = {}
+_watched_buses = set()
+
+
+def _clear_managed_objects(bus_name):
+    def cb(*args):
+        logger.debug('BlueZ objects changed, clearing cached adapters')
+        _managed_objects.pop(bus_name, None)
+    return cb
+
+
+def get_managed_objects(bus):
+    """Return BlueZ managed objects, only calling GetManagedObjects on a cache miss."""
+    bus_name = bus.get_unique_name()
+    objects = _managed_objects.get(bus_name)
+    if objects is None:
+        remote_om = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, '/'), DBUS_OM_IFACE)
+        objects = remote_om.GetManagedObjects()
+        if bus_name not in _watched_buses:
+            _watched_buses.add(bus_name)
+            clear_cb = _clear_managed_objects(bus_name)
+            for signal_name in ('InterfacesAdded', 'InterfacesRemoved'):
+                bus.add_signal_receiver(clear_cb, signal_name=signal_name, dbus_interface=DBUS_OM_IFACE,
+                                        bus_name=BLUEZ_SERVICE_NAME)
+        _managed_objects[bus_name] = objects
+    return objects
+
+
 def find_adapter(bus, adapter_interface_name, adapter_name):
-    remote_om = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, '/'), DBUS_OM_IFACE)
-    objects = remote_om.GetManagedObjects()
+    objects = get_managed_objects(bus)
 
     for o, props in objects.items():
-        logger.debug('checking adapter %s, keys: %s' % (o, props.keys()))
+        logger.debug('checking adapter %s, keys: %s', o, props.keys())
         if adapter_interface_name in props.keys():
-            logger.debug('found adapter %s' % (o,))
+            logger.debug('found adapter %s', o)
             if '/' + adapter_name in o:
-                logger.debug('returning adapter %s' % (o,))
+                logger.debug('returning adapter %s', o)
                 return o
 
     return None
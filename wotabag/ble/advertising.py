@@ -6,12 +6,11 @@ import dbus
 import dbus.exceptions
 import dbus.mainloop.glib
 import dbus.service
-import functools
 import logging
 
 from . import exceptions
 from . import adapters
-from .gatt_server import WotabagService
+from .gatt_server import PropertiesCacheMixin, WotabagService
 
 
 logger = logging.getLogger('wotabag')
@@ -24,62 +23,95 @@ DBUS_PROP_IFACE = 'org.freedesktop.DBus.Properties'
 
 LE_ADVERTISEMENT_IFACE = 'org.bluez.LEAdvertisement1'
 
+# Pre-built dbus values for the interface name used as a dict key and signal argument
+_LE_ADVERTISEMENT_IFACE = dbus.String(LE_ADVERTISEMENT_IFACE)
 
-class Advertisement(dbus.service.Object):
+_SIG_S = dbus.Signature('s')
+_SIG_Y = dbus.Signature('y')
+_SIG_QV = dbus.Signature('qv')
+_SIG_SV = dbus.Signature('sv')
+
+
+class Advertisement(PropertiesCacheMixin, dbus.service.Object):
     PATH_BASE = '/org/bluez/example/advertisement'
 
     def __init__(self, bus, index, advertising_type):
-        self.path = self.PATH_BASE + str(index)
+        self._object_path = dbus.ObjectPath(self.PATH_BASE + str(index))
+        self.path = str(self._object_path)
         self.bus = bus
         self.ad_type = advertising_type
         self.service_uuids = None
-        self.manufacturer_data = None
+        self.manufacturer_data = dbus.Dictionary({}, signature=_SIG_QV)
         self.solicit_uuids = None
-        self.service_data = None
-        self.include_tx_power = None
+        self.service_data = dbus.Dictionary({}, signature=_SIG_SV)
+        self._include_tx_power = None
         dbus.service.Object.__init__(self, bus, self.path)
 
-    def get_properties(self):
-        properties = dict()
-        properties['Type'] = self.ad_type
+    @property
+    def include_tx_power(self):
+        return self._include_tx_power
+
+    @include_tx_power.setter
+    def include_tx_power(self, value):
+        self._include_tx_power = value
+        self._properties_changed('IncludeTxPower')
+
+    def _build_properties(self):
+        # use explicitly typed dbus values, so that dbus-python can marshal
+        # the cached GetAll reply without guessing variant signatures
+        properties = dbus.Dictionary({}, signature=_SIG_SV)
+        properties['Type'] = dbus.String(self.ad_type)
         if self.service_uuids is not None:
             properties['ServiceUUIDs'] = dbus.Array(self.service_uuids,
-                                                    signature='s')
+                                                    signature=_SIG_S)
         if self.solicit_uuids is not None:
             properties['SolicitUUIDs'] = dbus.Array(self.solicit_uuids,
-                                                    signature='s')
-        if self.manufacturer_data is not None:
-            properties['ManufacturerData'] = dbus.Dictionary(
-                self.manufacturer_data, signature='qv')
-        if self.service_data is not None:
-            properties['ServiceData'] = dbus.Dictionary(self.service_data,
-                                                        signature='sv')
+                                                    signature=_SIG_S)
+        if self.manufacturer_data:
+            properties['ManufacturerData'] = self.manufacturer_data
+        if self.service_data:
+            properties['ServiceData'] = self.service_data
         if self.include_tx_power is not None:
             properties['IncludeTxPower'] = dbus.Boolean(self.include_tx_power)
-        return {LE_ADVERTISEMENT_IFACE: properties}
+        return {_LE_ADVERTISEMENT_IFACE: properties}
+
+    def _properties_changed(self, name):
+        """Invalidate cached properties and notify listeners that a property changed."""
+        self._invalidate_properties()
+        properties = self.get_properties()[LE_ADVERTISEMENT_IFACE]
+        if name in properties:
+            self.PropertiesChanged(_LE_ADVERTISEMENT_IFACE, {name: properties[name]}, [])
+        else:
+            self.PropertiesChanged(_LE_ADVERTISEMENT_IFACE, {}, [name])
 
     def get_path(self):
-        return dbus.ObjectPath(self.path)
+        return self._object_path
 
     def add_service_uuid(self, uuid):
         if not self.service_uuids:
             self.service_uuids = []
         self.service_uuids.append(uuid)
+        self._properties_changed('ServiceUUIDs')
 
     def add_solicit_uuid(self, uuid):
         if not self.solicit_uuids:
             self.solicit_uuids = []
         self.solicit_uuids.append(uuid)
+        self._properties_changed('SolicitUUIDs')
 
     def add_manufacturer_data(self, manuf_code, data):
-        if not self.manufacturer_data:
-            self.manufacturer_data = dbus.Dictionary({}, signature='qv')
-        self.manufacturer_data[manuf_code] = dbus.Array(data, signature='y')
+        if isinstance(data, (bytes, bytearray)):
+            self.manufacturer_data[manuf_code] = dbus.ByteArray(bytes(data))
+        else:
+            self.manufacturer_data[manuf_code] = dbus.Array(data, signature=_SIG_Y)
+        self._properties_changed('ManufacturerData')
 
     def add_service_data(self, uuid, data):
-        if not self.service_data:
-            self.service_data = dbus.Dictionary({}, signature='sv')
-        self.service_data[uuid] = dbus.Array(data, signature='y')
+        if isinstance(data, (bytes, bytearray)):
+            self.service_data[uuid] = dbus.ByteArray(bytes(data))
+        else:
+            self.service_data[uuid] = dbus.Array(data, signature=_SIG_Y)
+        self._properties_changed('ServiceData')
 
     @dbus.service.method(DBUS_PROP_IFACE,
                          in_signature='s',
@@ -91,11 +123,28 @@ class Advertisement(dbus.service.Object):
         logger.debug('returning props')
         return self.get_properties()[LE_ADVERTISEMENT_IFACE]
 
+    @dbus.service.method(DBUS_PROP_IFACE,
+                         in_signature='ss',
+                         out_signature='v')
+    def Get(self, interface, prop):
+        logger.debug('Get')
+        if interface != LE_ADVERTISEMENT_IFACE:
+            raise exceptions.InvalidArgsException()
+        properties = self.get_properties()[LE_ADVERTISEMENT_IFACE]
+        if prop not in properties:
+            raise exceptions.InvalidArgsException()
+        return properties[prop]
+
+    @dbus.service.signal(DBUS_PROP_IFACE,
+                         signature='sa{sv}as')
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
     @dbus.service.method(LE_ADVERTISEMENT_IFACE,
                          in_signature='',
                          out_signature='')
     def Release(self):
-        logger.debug('{}: Released!'.format(self.path))
+        logger.debug('%s: Released!', self.path)
 
 
 class WotabagAdvertisement(Advertisement):
@@ -107,7 +156,7 @@ class WotabagAdvertisement(Advertisement):
 
             Vendor/Manufacturer:
                 ID: 0xffff (reserved value for default vendor ID)
-                Data: ['W', 'O', 'T', 'A', 'B', 'A', 'G']
+                Data: b'WOtABAG'
 
             Available service UUID's:
                 0x1804: reserved Tx Power service
@@ -117,8 +166,7 @@ class WotabagAdvertisement(Advertisement):
         Advertisement.__init__(self, bus, index, 'peripheral')
         self.add_service_uuid(WotabagService.WOTABAG_SVC_UUID)
 
-        # (0xffff, ['W', 'O', 'T', 'A', 'B', 'A', 'G'])
-        self.add_manufacturer_data(0xffff, [0x57, 0x4f, 0x74, 0x41, 0x42, 0x41, 0x47])
+        self.add_manufacturer_data(0xffff, b'WOtABAG')
         self.include_tx_power = True
 
 
@@ -126,14 +174,16 @@ def register_ad_cb():
     logger.info('Advertisement registered')
 
 
-def register_ad_error_cb(mainloop, error):
-    logger.error('Failed to register advertisement: ' + str(error))
-    mainloop.quit()
+def register_ad_error_cb(mainloop):
+    def cb(error):
+        logger.error('Failed to register advertisement: %s', error)
+        mainloop.quit()
+    return cb
 
 
 def advertising_main(mainloop, bus, adapter_name):
     adapter = adapters.find_adapter(bus, LE_ADVERTISING_MANAGER_IFACE, adapter_name)
-    logger.info('adapter: %s' % (adapter,))
+    logger.info('adapter: %s', adapter)
     if not adapter:
         raise Exception('LEAdvertisingManager1 interface not found')
 
@@ -149,4 +199,4 @@ def advertising_main(mainloop, bus, adapter_name):
 
     ad_manager.RegisterAdvertisement(test_advertisement.get_path(), {},
                                      reply_handler=register_ad_cb,
-                                     error_handler=functools.partial(register_ad_error_cb, mainloop))
+                                     error_handler=register_ad_error_cb(mainloop))
@@ -16,8 +16,6 @@ import logging
 
 import array
 
-import functools
-
 from . import exceptions
 from . import adapters
 
@@ -39,6 +37,27 @@ GATT_CHRC_IFACE = 'org.bluez.GattCharacteristic1'
 GATT_DESC_IFACE = 'org.bluez.GattDescriptor1'
 
 
+class PropertiesCacheMixin(object):
+    """Cache the D-Bus properties dict of an exported object.
+
+    BlueZ requests the properties of every object frequently, while they rarely change after setup, so the dict is
+    only rebuilt after `_invalidate_properties()` has been called. Subclasses implement `_build_properties()`.
+
+    """
+    _properties = None
+
+    def get_properties(self):
+        if self._properties is None:
+            self._properties = self._build_properties()
+        return self._properties
+
+    def _build_properties(self):
+        raise NotImplementedError
+
+    def _invalidate_properties(self):
+        self._properties = None
+
+
 class WotabagApplication(dbus.service.Object):
     """
     org.bluez.GattApplication1 interface implementation
@@ -72,7 +91,7 @@ class WotabagApplication(dbus.service.Object):
         return response
 
 
-class Service(dbus.service.Object):
+class Service(PropertiesCacheMixin, dbus.service.Object):
     """
     org.bluez.GattService1 interface implementation
     """
@@ -86,7 +105,7 @@ class Service(dbus.service.Object):
         self.characteristics = []
         dbus.service.Object.__init__(self, bus, self.path)
 
-    def get_properties(self):
+    def _build_properties(self):
         return {
                 GATT_SERVICE_IFACE: {
                         'UUID': self.uuid,
@@ -102,6 +121,7 @@ class Service(dbus.service.Object):
 
     def add_characteristic(self, characteristic):
         self.characteristics.append(characteristic)
+        self._invalidate_properties()
 
     def get_characteristic_paths(self):
         result = []
@@ -122,7 +142,7 @@ class Service(dbus.service.Object):
         return self.get_properties()[GATT_SERVICE_IFACE]
 
 
-class Characteristic(dbus.service.Object):
+class Characteristic(PropertiesCacheMixin, dbus.service.Object):
     """
     org.bluez.GattCharacteristic1 interface implementation
     """
@@ -135,7 +155,7 @@ class Characteristic(dbus.service.Object):
         self.descriptors = []
         dbus.service.Object.__init__(self, bus, self.path)
 
-    def get_properties(self):
+    def _build_properties(self):
         return {
                 GATT_CHRC_IFACE: {
                         'Service': self.service.get_path(),
@@ -152,6 +172,7 @@ class Characteristic(dbus.service.Object):
 
     def add_descriptor(self, descriptor):
         self.descriptors.append(descriptor)
+        self._invalidate_properties()
 
     def get_descriptor_paths(self):
         result = []
@@ -199,7 +220,7 @@ class Characteristic(dbus.service.Object):
         pass
 
 
-class Descriptor(dbus.service.Object):
+class Descriptor(PropertiesCacheMixin, dbus.service.Object):
     """
     org.bluez.GattDescriptor1 interface implementation
     """
@@ -211,7 +232,7 @@ class Descriptor(dbus.service.Object):
         self.chrc = characteristic
         dbus.service.Object.__init__(self, bus, self.path)
 
-    def get_properties(self):
+    def _build_properties(self):
         return {
                 GATT_DESC_IFACE: {
                         'Characteristic': self.chrc.get_path(),
@@ -287,8 +308,7 @@ class WotabagRPCCharacteristic(Characteristic):
                 {'Value': dbus.ByteArray(data)}, [])
 
     def WriteValue(self, value, options):
-        data = b''.join([bytes([v]) for v in value])
-        self.rpc_transport.process(data)
+        self.rpc_transport.process(bytes(value))
 
     def StartNotify(self):
         if self.notifying:
@@ -323,9 +343,11 @@ def register_app_cb():
     logger.info('GATT application registered')
 
 
-def register_app_error_cb(mainloop, error):
-    logger.error('Failed to register application: ' + str(error))
-    mainloop.quit()
+def register_app_error_cb(mainloop):
+    def cb(error):
+        logger.error('Failed to register application: %s', error)
+        mainloop.quit()
+    return cb
 
 
 def gatt_server_main(mainloop, bus, adapter_name, rpc_transport):
@@ -343,4 +365,4 @@ def gatt_server_main(mainloop, bus, adapter_name, rpc_transport):
 
     service_manager.RegisterApplication(app.get_path(), {},
                                         reply_handler=register_app_cb,
-                                        error_handler=functools.partial(register_app_error_cb, mainloop))
+                                        error_handler=register_app_error_cb(mainloop))
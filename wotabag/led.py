@@ -9,9 +9,12 @@ Based on rpi-ws281x-python strandtest.py.
 """
 
 import logging
+import queue
 import time
 from collections import OrderedDict
 from enum import Enum
+from functools import lru_cache, partial
+from threading import Thread
 
 from rpi_ws281x import PixelStrip, Color
 
@@ -74,6 +77,15 @@ class BladeColor(Enum):
     MAKI = Color(0xff, 0x00, 0x01)      # Red - Ruifan RGBW(0xff, 0x00, 0x01, 0x00)
 
 
+# Raw color value for an unlit pixel, for use in tick() hot paths
+_NONE = BladeColor.NONE.value
+
+# (pixel index, color value) pairs turning off every pixel
+_ALL_OFF = tuple((i, _NONE) for i in range(27))
+
+# (pixel index, blade) pairs lit by each of the three light chase steps
+_CHASE_PIXELS = tuple(tuple((i, i // 9) for i in range(q, 27, 3)) for q in range(3))
+
 # Color sequence in official Aqours Kingblade order
 aqours = (
     BladeColor.CHIKA,
@@ -203,35 +215,76 @@ def pixel_index(x, y):
     return 9 * x + y
 
 
+_AQOURS_RAINBOW_REVERSED = tuple(reversed(aqours_rainbow))
+
+# Raw color values of the Aqours rainbow, for use in tick() hot paths
+_AQOURS_RAINBOW_VALUES = tuple(color.value for color in aqours_rainbow)
+_AQOURS_RAINBOW_VALUES_REVERSED = tuple(reversed(_AQOURS_RAINBOW_VALUES))
+
+
 def get_aqours_rainbow(reverse=False):
     if reverse:
-        return tuple(reversed(aqours_rainbow))
+        return _AQOURS_RAINBOW_REVERSED
     return aqours_rainbow
 
 
+def get_aqours_rainbow_values(reverse=False):
+    """Return the raw color values of get_aqours_rainbow()."""
+    if reverse:
+        return _AQOURS_RAINBOW_VALUES_REVERSED
+    return _AQOURS_RAINBOW_VALUES
+
+
+def fill_strip(strip, color):
+    """Set every pixel to the same color and display it."""
+    set_pixel = strip.setPixelColor
+    for i in range(strip.numPixels()):
+        set_pixel(i, color)
+    strip.show()
+
+
+def show_frame(strip, frame):
+    """Set every pixel from a sequence of color values, in pixel index order, and display it."""
+    set_pixel = strip.setPixelColor
+    for i, color in enumerate(frame):
+        set_pixel(i, color)
+    strip.show()
+
+
 # Define functions which animate LEDs in various ways.
-def color_wipe(strip, color, wait_ms=50):
-    """Wipe color across display a pixel at a time."""
+def color_wipe(strip, color, wait_ms=50, cancel=None):
+    """Wipe color across display a pixel at a time.
+
+    If cancel (threading.Event) is given, the wipe stops as soon as it is set.
+
+    """
+    set_pixel = strip.setPixelColor
+    wait_s = wait_ms / 1000.0
     for i in range(strip.numPixels()):
-        strip.setPixelColor(i, color)
+        set_pixel(i, color)
         strip.show()
-        time.sleep(wait_ms / 1000.0)
+        if cancel is None:
+            time.sleep(wait_s)
+        elif cancel.wait(wait_s):
+            return
 
 
 def theaterChase(strip, color, wait_ms=50, iterations=10):
     """Movie theater light style chaser animation."""
+    set_pixel = strip.setPixelColor
+    num_pixels = strip.numPixels()
+    wait_s = wait_ms / 1000.0
     for j in range(iterations):
         for q in range(3):
-            for i in range(0, strip.numPixels(), 3):
-                strip.setPixelColor(i + q, color)
+            for i in range(0, num_pixels, 3):
+                set_pixel(i + q, color)
             strip.show()
-            time.sleep(wait_ms / 1000.0)
-            for i in range(0, strip.numPixels(), 3):
-                strip.setPixelColor(i + q, 0)
+            time.sleep(wait_s)
+            for i in range(0, num_pixels, 3):
+                set_pixel(i + q, 0)
 
 
-def wheel(pos):
-    """Generate rainbow colors across 0-255 positions."""
+def _wheel(pos):
     if pos < 85:
         return Color(pos * 3, 255 - pos * 3, 0)
     elif pos < 170:
@@ -242,35 +295,49 @@ def wheel(pos):
         return Color(0, pos * 3, 255 - pos * 3)
 
 
+# wheel() color for every position, so animations can use a table lookup
+_WHEEL = tuple(_wheel(pos) for pos in range(256))
+
+
+def wheel(pos):
+    """Generate rainbow colors across 0-255 positions."""
+    return _WHEEL[pos]
+
+
 def rainbow(strip, wait_ms=20, iterations=1):
     """Draw rainbow that fades across all pixels at once."""
+    num_pixels = strip.numPixels()
     for j in range(256 * iterations):
-        for i in range(strip.numPixels()):
-            strip.setPixelColor(i, wheel((i + j) & 255))
+        for i in range(num_pixels):
+            strip.setPixelColor(i, _WHEEL[(i + j) & 255])
         strip.show()
         time.sleep(wait_ms / 1000.0)
 
 
 def rainbowCycle(strip, wait_ms=20, iterations=5):
     """Draw rainbow that uniformly distributes itself across all pixels."""
+    num_pixels = strip.numPixels()
+    offsets = [int(i * 256 / num_pixels) for i in range(num_pixels)]
     for j in range(256 * iterations):
-        for i in range(strip.numPixels()):
-            strip.setPixelColor(i, wheel(
-                (int(i * 256 / strip.numPixels()) + j) & 255))
+        for i, offset in enumerate(offsets):
+            strip.setPixelColor(i, _WHEEL[(offset + j) & 255])
         strip.show()
         time.sleep(wait_ms / 1000.0)
 
 
 def theaterChaseRainbow(strip, wait_ms=50):
     """Rainbow movie theater light style chaser animation."""
+    set_pixel = strip.setPixelColor
+    num_pixels = strip.numPixels()
+    wait_s = wait_ms / 1000.0
     for j in range(256):
         for q in range(3):
-            for i in range(0, strip.numPixels(), 3):
-                strip.setPixelColor(i + q, wheel((i + j) % 255))
+            for i in range(0, num_pixels, 3):
+                set_pixel(i + q, _WHEEL[(i + j) % 255])
             strip.show()
-            time.sleep(wait_ms / 1000.0)
-            for i in range(0, strip.numPixels(), 3):
-                strip.setPixelColor(i + q, 0)
+            time.sleep(wait_s)
+            for i in range(0, num_pixels, 3):
+                set_pixel(i + q, 0)
 
 
 class BaseWota(object):
@@ -285,16 +352,27 @@ class BaseWota(object):
         """
         self.strip = strip
         self.beats = beats
+        # number of ticks in one pattern, cached since it is needed on every tick
+        self._period = beats * 8
+        # tick counts wrap around after three patterns, which keeps both `count % len(self)` and the light chase
+        # step (`count % 3`) in phase while the count itself stays small over a long set
+        self._count_wrap = self._period * 3
         self.bpm = bpm
         self.rainbow = None
+        self._chase = {}
 
     def __len__(self):
-        return self.beats * 8
+        return self._period
 
     @property
-    def tick_s(self):
-        """Return the length of one tick in seconds."""
-        return 1 / (self.bpm * 8 / 60)
+    def bpm(self):
+        return self._bpm
+
+    @bpm.setter
+    def bpm(self, bpm):
+        self._bpm = bpm
+        # length of one tick in seconds, cached since it is read on every sleep
+        self.tick_s = 1 / (bpm * 8 / 60)
 
     def tick(self, *args, **kwargs):
         """Perform one tick from this movement, and then return.
@@ -310,46 +388,247 @@ class BaseWota(object):
         """
         raise NotImplementedError
 
+    def _build_frame(self):
+        """Return the color value of every pixel when this pattern is fully lit.
+
+        Rainbow and per-pixel color sequences are resolved here once, so that
+        ticks only need to look up pixel values by index.
+
+        """
+        return _pattern_frame(self.colors, self.rainbow)
+
+    def _play_steps(self, steps):
+        """Display a precomputed sequence of sub-tick animation steps.
+
+        Each step is either a list of (pixel index, color value) pairs, which are written to the strip and then
+        displayed with a single `show()`, or a float, which sleeps for that fraction of one tick.
+
+        """
+        tick_s = self.tick_s
+        show_pixels = self._show_pixels
+        for step in steps:
+            if isinstance(step, float):
+                time.sleep(step * tick_s)
+            else:
+                show_pixels(step)
+
+    def _show_pixels(self, pixels):
+        """Write a list of (pixel index, color value) pairs to the strip and display them."""
+        set_pixel = self.strip.setPixelColor
+        for i, value in pixels:
+            set_pixel(i, value)
+        self.strip.show()
+
+    def _show(self, pixels):
+        """Return an action which displays the given (pixel index, color value) pairs."""
+        return partial(self._show_pixels, pixels)
+
+    def _set_actions(self, actions):
+        """Set the actions performed by `_tick_actions()`.
+
+        Parameters:
+            actions (dict): Callables keyed by the tick count they should be run on. Nothing is done on other ticks.
+
+        """
+        self._actions = tuple(actions.get(count) for count in range(self._period))
+
+    def _tick_actions(self):
+        """Perform one tick of a pattern which only consists of precomputed actions."""
+        action = self._actions[self._count % self._period]
+        if action is not None:
+            action()
+        self._count = (self._count + 1) % self._count_wrap
+
     # Convenience methods for common lighting effects
 
     def all_off(self):
-        for i in range(27):
-            self.strip.setPixelColor(i, 0)
-        self.strip.show()
+        self._show_pixels(_ALL_OFF)
 
     def light_chase(self, left=True, center=True, right=True):
         """Display a chase effect."""
-        q = self._count % 3
-        for i in range(0, 27, 3):
-            x = (i + q) // 9
-            y = (i + q) % 9
-            if x == 0 and left:
-                if self.rainbow:
-                    color = self.rainbow[y]
-                else:
-                    color = self.colors[0]
-                    if isinstance(color, tuple):
-                        color = color[y % len(color)]
-            elif x == 1 and center:
-                if self.rainbow:
-                    color = self.rainbow[y]
-                else:
-                    color = self.colors[1]
-                    if isinstance(color, tuple):
-                        color = color[y % len(color)]
-            elif x == 2 and right:
-                if self.rainbow:
-                    color = self.rainbow[y]
-                else:
-                    color = self.colors[2]
-                    if isinstance(color, tuple):
-                        color = color[y % len(color)]
-            else:
-                color = BladeColor.NONE
-            self.strip.setPixelColor(i + q, color.value)
-        self.strip.show()
-        for i in range(0, 27, 3):
-            self.strip.setPixelColor(i + q, BladeColor.NONE.value)
+        lanes = (left, center, right)
+        chase = self._chase.get(lanes)
+        if chase is None:
+            chase = self._chase[lanes] = _chase_steps(self._build_frame(), lanes)
+        self._play_chase(chase)
+
+    def _chase_action(self, left=True, center=True, right=True):
+        """Return an action which displays a chase effect, for use in `_set_actions()`."""
+        return partial(self._play_chase, _chase_steps(self._build_frame(), (left, center, right)))
+
+    def _play_chase(self, chase):
+        """Display the current step of a precomputed chase, as returned by `_chase_steps()`."""
+        on, off = chase[self._count % 3]
+        self._show_pixels(on)
+        set_pixel = self.strip.setPixelColor
+        for i, value in off:
+            set_pixel(i, value)
+
+
+# Frames and step tables only depend on a pattern's colors, so they are
+# memoized and shared between pattern instances. Patterns are created for
+# every entry in a song's pattern list during playback, and the same few
+# color combinations are used over and over again.
+@lru_cache(maxsize=None)
+def _pattern_frame(colors, rainbow):
+    if rainbow:
+        return tuple(rainbow) * 3
+    left, center, right = colors
+    return _blade_values(left) + _blade_values(center) + _blade_values(right)
+
+
+@lru_cache(maxsize=None)
+def _blade_values(color):
+    """Return the color value of each pixel in a blade lit with a BladeColor or tuple of BladeColors."""
+    if isinstance(color, tuple):
+        return tuple(color[y % len(color)].value for y in range(9))
+    return (color.value,) * 9
+
+
+@lru_cache(maxsize=None)
+def _frame_pixels(frame):
+    """Return (pixel index, color value) pairs for displaying an entire frame."""
+    return tuple(enumerate(frame))
+
+
+@lru_cache(maxsize=None)
+def _chase_steps(frame, lanes):
+    """Return the (on, off) pixel runs for each of the three light chase steps.
+
+    Parameters:
+        frame (tuple): Pattern frame as returned by `BaseWota._build_frame()`.
+        lanes (tuple): Whether the left, center and right blades are lit.
+
+    """
+    chase = []
+    for pixels in _CHASE_PIXELS:
+        on = tuple((i, frame[i] if lanes[x] else _NONE) for i, x in pixels)
+        off = tuple((i, _NONE) for i, x in pixels)
+        chase.append((on, off))
+    return tuple(chase)
+
+
+# The pixel run builders below are memoized, so that patterns which light or
+# clear the same rows or blades share a single (immutable) run of pixels. Rows
+# and blades must be passed as tuples or ranges.
+@lru_cache(maxsize=None)
+def _rows_on(frame, rows):
+    """Return (pixel index, color value) pairs lighting the given rows in all three blades."""
+    return tuple((9 * x + y, frame[9 * x + y]) for y in rows for x in range(3))
+
+
+@lru_cache(maxsize=None)
+def _rows_off(rows):
+    """Return (pixel index, color value) pairs turning off the given rows in all three blades."""
+    return tuple((9 * x + y, _NONE) for y in rows for x in range(3))
+
+
+@lru_cache(maxsize=None)
+def _blades_on(frame, blades, rows=range(9)):
+    """Return (pixel index, color value) pairs lighting the given rows of the given blades."""
+    return tuple((9 * x + y, frame[9 * x + y]) for x in blades for y in rows)
+
+
+@lru_cache(maxsize=None)
+def _blades_off(blades, rows=range(9)):
+    """Return (pixel index, color value) pairs turning off the given rows of the given blades."""
+    return tuple((9 * x + y, _NONE) for x in blades for y in rows)
+
+
+@lru_cache(maxsize=None)
+def _normal_odd_steps(frame):
+    """Return the sub-tick animation steps for the odd (half height) beat of the default wota.
+
+    Steps are indexed by tick count, in the format used by `BaseWota._play_steps()`. Ticks with nothing to display
+    are None.
+
+    """
+    third = 1 / 3
+    return (
+        # half height
+        (_rows_on(frame, range(5)) + _rows_off(range(5, 9)),),
+        None,
+        None,
+        (third, _rows_off((5,)), third, _rows_off((4,))),
+        (_rows_off((3,)), third, _rows_off((2,)), third, _rows_off((1,))),
+        (_rows_off((0,)), third, _rows_on(frame, (0,)), third, _rows_on(frame, (1,))),
+        (_rows_on(frame, (2,)), third, _rows_on(frame, (3,)), _rows_on(frame, (4,))),
+        (_rows_on(frame, (5,)), third, _rows_on(frame, (6,)), third, _rows_on(frame, (7,))),
+    )
+
+
+@lru_cache(maxsize=None)
+def _normal_even_steps(frame):
+    """Return the sub-tick animation steps for the even (full height) beat of the default wota.
+
+    Steps are indexed by tick count, in the format used by `BaseWota._play_steps()`. Ticks with nothing to display
+    are None.
+
+    """
+    third = 1 / 3
+    return (
+        # full height
+        (_frame_pixels(frame),),
+        None,
+        None,
+        (2 * third, _rows_off((8,))),
+        (_rows_off((7,)), third, _rows_off((6,)), third, _rows_off((5,))),
+        (_rows_off((4,)), third, _rows_off((3,)), third, _rows_off((2,))),
+        (_rows_off((1,)), third, _rows_off((0,)), third, _rows_on(frame, (0,))),
+        (_rows_on(frame, (1,)), third, _rows_on(frame, (2,)), third, _rows_on(frame, (3,))),
+    )
+
+
+@lru_cache(maxsize=None)
+def _slow_wipe(frame):
+    """Return the pixels to display for each row of a slow full height wipe.
+
+    The first row also turns off every other row.
+
+    """
+    return [_rows_on(frame, (0,)) + _rows_off(range(1, 9))] + [_rows_on(frame, (y,)) for y in range(1, 9)]
+
+
+# Whether each pixel in a blade is lit for each of the 9 spin positions
+_SPIN_LIT = tuple(tuple(y in (n, (n + 4) % 9) for y in range(9)) for n in range(9))
+
+
+@lru_cache(maxsize=None)
+def _spin_frames(frame, reverse):
+    """Return the pixels to display for each tick of a one beat spin."""
+    frames = []
+    for count in range(8):
+        # left and right blades spin in the opposite direction from the center
+        if reverse:
+            outer, inner = 8 - count, count
+        else:
+            outer, inner = count, 8 - count
+        pixels = []
+        for x in range(3):
+            lit = _SPIN_LIT[inner if x == 1 else outer]
+            pixels.extend((9 * x + y, frame[9 * x + y] if lit[y] else _NONE) for y in range(9))
+        frames.append(tuple(pixels))
+    return tuple(frames)
+
+
+@lru_cache(maxsize=None)
+def _rising_chase_steps(frame):
+    """Return light chase steps where the left and right blades are only lit up to a given height.
+
+    Steps are indexed by height (0-8) and then chase step. Each step lights its own pixels and turns off the pixels
+    lit by the previous step, so that no separate clearing pass is needed after displaying it. The center blade is
+    always fully lit.
+
+    """
+    heights = []
+    for height in range(9):
+        chase = []
+        for q, pixels in enumerate(_CHASE_PIXELS):
+            off = tuple((i, _NONE) for i, x in _CHASE_PIXELS[q - 1])
+            on = tuple((i, frame[i] if x == 1 or i % 9 <= height else _NONE) for i, x in pixels)
+            chase.append(off + on)
+        heights.append(tuple(chase))
+    return tuple(heights)
 
 
 class WotaNormal(BaseWota):
@@ -364,13 +643,12 @@ class WotaNormal(BaseWota):
         super().__init__(beats=2, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
-        if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+        self._odd = WotaNormalOdd(left, center, right, rainbow=rainbow, reverse=reverse, strip=self.strip,
+                                  bpm=self.bpm)
+        self._even = WotaNormalEven(left, center, right, rainbow=rainbow, reverse=reverse, strip=self.strip,
+                                    bpm=self.bpm)
+        self.rainbow = self._odd.rainbow
 
-    # TODO: split this into even_tick and odd_tick functions, and make
-    # WotaNormalOdd and WotaNormalEven just inherit from this class and use the
-    # appropriate tick function. Currently all of this code is duplicated in
-    # the even/odd classes
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern.
 
@@ -379,130 +657,18 @@ class WotaNormal(BaseWota):
                 items in a sequence).
 
         """
-        count = self._count % len(self)
+        count = self._count % self._period
 
         # beat 1
-        if count == 0:
-            # half height
-            for y in range(9):
-                for x, color in enumerate(self.colors):
-                    if y < 5:
-                        if self.rainbow:
-                            color = self.rainbow[y]
-                        elif isinstance(color, tuple):
-                            color = color[y % len(color)]
-                        self.strip.setPixelColor(pixel_index(x, y), color.value)
-                    else:
-                        self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 3:
-            time.sleep(self.tick_s / 3)
-            for y in range(5, 3, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 4:
-                    time.sleep(self.tick_s / 3)
-        elif count == 4:
-            for y in range(3, 0, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 1:
-                    time.sleep(self.tick_s / 3)
-        elif count == 5:
-            for x in range(3):
-                self.strip.setPixelColor(pixel_index(x, 0), BladeColor.NONE.value)
-            self.strip.show()
-            time.sleep(self.tick_s / 3)
-            for y in range(0, 2):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 1:
-                    time.sleep(self.tick_s / 3)
-        elif count == 6:
-            for y in range(2, 5):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 3:
-                    time.sleep(self.tick_s / 3)
-        elif count == 7:
-            for y in range(5, 8):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 7:
-                    time.sleep(self.tick_s / 3)
-
-        # Beat 2
-        elif count == 8:
-            # full height
-            for y in range(9):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 11 and loop:
-            time.sleep(2 * self.tick_s / 3)
-            for x in range(3):
-                self.strip.setPixelColor(pixel_index(x, 8), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 12 and loop:
-            for y in range(7, 4, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 5:
-                    time.sleep(self.tick_s / 3)
-        elif count == 13 and loop:
-            for y in range(4, 1, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 2:
-                    time.sleep(self.tick_s / 3)
-        elif count == 14 and loop:
-            for y in range(1, -1, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                time.sleep(self.tick_s / 3)
-            for x, color in enumerate(self.colors):
-                if self.rainbow:
-                    color = self.rainbow[0]
-                elif isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(x, 0), color.value)
-            self.strip.show()
-        elif count == 15 and loop:
-            for y in range(1, 4):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[0]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 3:
-                    time.sleep(self.tick_s / 3)
-        self._count += 1
+        if count < 8:
+            self._odd._count = count
+            self._odd.tick(loop=loop)
+
+        # Beat 2 - wave down is only displayed when looping
+        elif count == 8 or loop:
+            self._even._count = count - 8
+            self._even.tick(loop=loop)
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaNormalOdd(BaseWota):
@@ -516,7 +682,9 @@ class WotaNormalOdd(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._frame = self._build_frame()
+        self._steps = _normal_odd_steps(self._frame)
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern.
@@ -526,67 +694,10 @@ class WotaNormalOdd(BaseWota):
                 items in a sequence).
 
         """
-        count = self._count % len(self)
-
-        # beat 1
-        if count == 0:
-            # half height
-            for y in range(9):
-                for x, color in enumerate(self.colors):
-                    if y < 5:
-                        if self.rainbow:
-                            color = self.rainbow[y]
-                        self.strip.setPixelColor(pixel_index(x, y), color.value)
-                    else:
-                        self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 3:
-            time.sleep(self.tick_s / 3)
-            for y in range(5, 3, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 4:
-                    time.sleep(self.tick_s / 3)
-        elif count == 4:
-            for y in range(3, 0, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 1:
-                    time.sleep(self.tick_s / 3)
-        elif count == 5:
-            for x in range(3):
-                self.strip.setPixelColor(pixel_index(x, 0), BladeColor.NONE.value)
-            self.strip.show()
-            time.sleep(self.tick_s / 3)
-            for y in range(0, 2):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 1:
-                    time.sleep(self.tick_s / 3)
-        elif count == 6:
-            for y in range(2, 5):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 3:
-                    time.sleep(self.tick_s / 3)
-        elif count == 7:
-            for y in range(5, 8):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 7:
-                    time.sleep(self.tick_s / 3)
-        self._count += 1
+        steps = self._steps[self._count % self._period]
+        if steps:
+            self._play_steps(steps)
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaNormalEven(BaseWota):
@@ -600,63 +711,18 @@ class WotaNormalEven(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._frame = self._build_frame()
+        self._steps = _normal_even_steps(self._frame)
 
     def tick(self, **kwargs):
         """Perform one tick from this pattern.
 
         """
-        count = self._count % len(self)
-
-        # Beat 1
-        if count == 0:
-            # full height
-            for y in range(9):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 3:
-            time.sleep(2 * self.tick_s / 3)
-            for x in range(3):
-                self.strip.setPixelColor(pixel_index(x, 8), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 4:
-            for y in range(7, 4, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 5:
-                    time.sleep(self.tick_s / 3)
-        elif count == 5:
-            for y in range(4, 1, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                if y > 2:
-                    time.sleep(self.tick_s / 3)
-        elif count == 6:
-            for y in range(1, -1, -1):
-                for x in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-                self.strip.show()
-                time.sleep(self.tick_s / 3)
-            for x, color in enumerate(self.colors):
-                if self.rainbow:
-                    color = self.rainbow[y]
-                self.strip.setPixelColor(pixel_index(x, 0), color.value)
-            self.strip.show()
-        elif count == 7:
-            for y in range(1, 4):
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-                if y < 3:
-                    time.sleep(self.tick_s / 3)
-        self._count += 1
+        steps = self._steps[self._count % self._period]
+        if steps:
+            self._play_steps(steps)
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaSlow(BaseWota):
@@ -672,7 +738,8 @@ class WotaSlow(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._wipe = _slow_wipe(self._build_frame())
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern.
@@ -680,32 +747,14 @@ class WotaSlow(BaseWota):
         Beat 1-4: slow full height wipe
 
         """
-        count = self._count % len(self)
+        count = self._count % self._period
 
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                if self.rainbow:
-                    color = self.rainbow[0]
-                elif isinstance(color, tuple):
-                    color = color[0]
-                self.strip.setPixelColor(pixel_index(x, 0), color.value)
-                for y in range(1, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count % 2 == 0:
-            y = count // 2
-            if y < 9:
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
+        if count % 2 == 0 and count < 18:
+            self._show_pixels(self._wipe[count // 2])
         elif count == 31:
             self.all_off()
 
-        self._count += 1
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaSlow3(BaseWota):
@@ -720,7 +769,8 @@ class WotaSlow3(BaseWota):
         self.hold = hold
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._wipe = _slow_wipe(self._build_frame())
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern.
@@ -728,32 +778,14 @@ class WotaSlow3(BaseWota):
         Beat 1-3: slow full height wipe
 
         """
-        count = self._count % len(self)
+        count = self._count % self._period
 
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                if self.rainbow:
-                    color = self.rainbow[0]
-                elif isinstance(color, tuple):
-                    color = color[0]
-                self.strip.setPixelColor(pixel_index(x, 0), color.value)
-                for y in range(1, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count % 2 == 0:
-            y = count // 2
-            if y < 9:
-                for x, color in enumerate(self.colors):
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
+        if count % 2 == 0 and count < 18:
+            self._show_pixels(self._wipe[count // 2])
         elif count == 23 and not self.hold:
             self.all_off()
 
-        self._count += 1
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaHold(BaseWota):
@@ -768,7 +800,8 @@ class WotaHold(BaseWota):
         self.hold = hold
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._full_frame = _frame_pixels(self._build_frame())
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern.
@@ -776,22 +809,14 @@ class WotaHold(BaseWota):
         Beat 1-3: slow full height wipe
 
         """
-        count = self._count % len(self)
+        count = self._count % self._period
 
         if count == 0:
-            for x in range(len(self.colors)):
-                for y in range(0, 9):
-                    color = self.colors[x]
-                    if self.rainbow:
-                        color = self.rainbow[y]
-                    elif isinstance(color, tuple):
-                        color = color[y % len(color)]
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
+            self._show_pixels(self._full_frame)
         elif count == 7 and not self.hold:
             self.all_off()
 
-        self._count += 1
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaHai(BaseWota):
@@ -805,25 +830,36 @@ class WotaHai(BaseWota):
         super().__init__(beats=2, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        # beat 1: off, beat 2: chase
+        chase = self._chase_action()
+        actions = {count: chase for count in range(8, 16)}
+        actions[0] = self.all_off
+        self._set_actions(actions)
 
     def tick(self, *args, **kwargs):
         """Perform one tick from this pattern.
 
         """
-        count = self._count % len(self)
-
-        # beat 1
-        if count == 0:
-            self.all_off()
-
-        # Beat 2
-        elif count >= 8:
-            self.light_chase()
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaSenoHai(BaseWota):
 
+    # Action for each tick count, indexes into self._actions:
+    # 0: nothing, 1: full height, 2: off, 3: light chase, 4-6: left/center/right only light chase
+    _ACTIONS = bytes(
+        [1, 0, 0, 0, 0, 0, 2, 0] +  # beat 1 (Se)
+        [1, 0, 0, 0, 0, 0, 2, 0] +  # beat 2 (no)
+        [3] * 8 +                   # beat 3
+        [2] + [0] * 7 +             # beat 4
+        [3] * 8 +                   # beat 5
+        [2] + [0] * 7 +             # beat 6
+        [4] * 8 +                   # beat 7
+        [5] * 8 +                   # beat 8
+        [6] * 8 +                   # beat 9
+        [3] * 8                     # beat 10
+    )
+
     def __init__(self, left=BladeColor.YOSHIKO, center=BladeColor.YOSHIKO, right=BladeColor.YOSHIKO, *args, **kwargs):
         """Aqours Seno Hai!- Hai!- 4xHai! wota pattern.
 
@@ -833,41 +869,24 @@ class WotaSenoHai(BaseWota):
         super().__init__(beats=10, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        self._actions = (
+            None,
+            self._show(_frame_pixels(self._build_frame())),
+            self.all_off,
+            self._chase_action(),
+            self._chase_action(center=False, right=False),
+            self._chase_action(left=False, right=False),
+            self._chase_action(left=False, center=False),
+        )
 
     def tick(self, **kwargs):
         """Perform one tick from this pattern.
 
         """
-        count = self._count % len(self)
-
-        # start of beats 1, 2 (Se, no)
-        if count == 0 or count == 8:
-            for y in range(9):
-                for x, color in enumerate(self.colors):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-
-        # end of beats 1, 2, start of beats 4, 6
-        elif count in (6, 14, 24, 40):
-            self.all_off()
-
-        # beats 3, 5, 10
-        elif (count >= 16 and count < 24) or (count >= 32 and count < 40) or (count >= 72):
-            self.light_chase()
-
-        # beat 7
-        elif count >= 48 and count < 56:
-            self.light_chase(center=False, right=False)
-
-        # beat 8
-        elif count >= 56 and count < 64:
-            self.light_chase(left=False, right=False)
-
-        # beat 9
-        elif count >= 64 and count < 72:
-            self.light_chase(left=False, center=False)
-
-        self._count += 1
+        action = self._actions[self._ACTIONS[self._count % self._period]]
+        if action:
+            action()
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaOhHai(BaseWota):
@@ -884,27 +903,15 @@ class WotaOhHai(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        wipe = _slow_wipe(self._build_frame())
+        actions = {2 * y: self._show(pixels) for y, pixels in enumerate(wipe)}
+        chase = self._chase_action()
+        actions.update((count, chase) for count in range(24, 32))
+        self._set_actions(actions)
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                self.strip.setPixelColor(pixel_index(x, 0), color.value)
-                for y in range(1, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count < 24 and (count % 2 == 0):
-            y = count // 2
-            if y < 9:
-                for x, color in enumerate(self.colors):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                self.strip.show()
-        elif count >= 24:
-            self.light_chase()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaFlash(BaseWota):
@@ -914,20 +921,12 @@ class WotaFlash(BaseWota):
         super().__init__(beats=1, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: full, 7: self.all_off})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 7:
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaFlash2(BaseWota):
@@ -940,20 +939,12 @@ class WotaFlash2(BaseWota):
         super().__init__(beats=1, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: full, 3: self.all_off, 4: full, 7: self.all_off})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 4):
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count in (3, 7):
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaFufu(BaseWota):
@@ -965,20 +956,12 @@ class WotaFufu(BaseWota):
         super().__init__(beats=1, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: full, 1: self.all_off, 3: full, 7: self.all_off})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 3):
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count in (1, 7):
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaChase(BaseWota):
@@ -992,13 +975,14 @@ class WotaChase(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         if rainbow:
-            self.rainbow = get_aqours_rainbow(reverse)
+            self.rainbow = get_aqours_rainbow_values(reverse)
+        self._full_chase = _chase_steps(self._build_frame(), (True, True, True))
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        self.light_chase()
+        self._play_chase(self._full_chase)
 
-        self._count += 1
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaSpin(BaseWota):
@@ -1010,30 +994,12 @@ class WotaSpin(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         self.reverse = reverse
+        frames = _spin_frames(self._build_frame(), reverse)
+        self._set_actions({count: self._show(pixels) for count, pixels in enumerate(frames)})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        for x, color in enumerate(self.colors):
-            for y in range(9):
-                if x in (0, 2):
-                    if self.reverse:
-                        n = 8 - count
-                    else:
-                        n = count
-                else:
-                    if self.reverse:
-                        n = count
-                    else:
-                        n = 8 - count
-                if y in (n, (n + 4) % 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                else:
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-        self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaAozoraHora(BaseWota):
@@ -1043,40 +1009,22 @@ class WotaAozoraHora(BaseWota):
         super().__init__(beats=8, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        full = self._show(_frame_pixels(frame))
+        self._set_actions({
+            0: full,
+            3: self.all_off,
+            4: full,
+            7: self.all_off,
+            16: self._show(_rows_on(frame, range(0, 2))),
+            28: self._show(_rows_on(frame, range(2, 4))),
+            40: self._show(_rows_on(frame, range(4, 6))),
+            48: self._show(_rows_on(frame, range(6, 9))),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0 or count == 4:
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 3 or count == 7:
-            self.all_off()
-        elif count == 16:
-            for x, color in enumerate(self.colors):
-                for y in range(0, 2):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 28:
-            for x, color in enumerate(self.colors):
-                for y in range(2, 4):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 40:
-            for x, color in enumerate(self.colors):
-                for y in range(4, 6):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 48:
-            for x, color in enumerate(self.colors):
-                for y in range(6, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaAozoraAshita(BaseWota):
@@ -1086,36 +1034,22 @@ class WotaAozoraAshita(BaseWota):
         super().__init__(beats=16, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        chase = self._chase_action(left=False, right=False)
+        actions = {count: chase for count in range(96, 128)}
+        # right, left and then center blades are lit one pixel every two ticks, while the previous blade is turned
+        # off from the top down. Ticks which would not change any pixels are skipped.
+        for y in range(9):
+            actions[2 * y] = self._show(((18 + y, frame[18 + y]),))
+            actions[32 + 2 * y] = self._show(((y, frame[y]), (26 - y, _NONE)))
+            actions[64 + 2 * y] = self._show(((9 + y, frame[9 + y]), (8 - y, _NONE)))
+        # the first pixel replaces clearing the entire strip
+        actions[0] = self._show(_blades_off((0, 1)) + _blades_on(frame, (2,), (0,)) + _blades_off((2,), range(1, 9)))
+        self._set_actions(actions)
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x in range(3):
-                for y in range(9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-        if count < 96 and count % 2 == 0:
-            if count < 32:
-                on = 2
-                off = None
-            elif count < 64:
-                on = 0
-                off = 2
-            else:
-                on = 1
-                off = 0
-            color = self.colors[on]
-            y = count % 32 // 2
-            if y < 9:
-                self.strip.setPixelColor(pixel_index(on, y), color.value)
-                if off is not None:
-                    self.strip.setPixelColor(pixel_index(off, 8 - y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count >= 96:
-            self.light_chase(left=False, right=False)
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaAozoraMasshigura(BaseWota):
@@ -1125,37 +1059,16 @@ class WotaAozoraMasshigura(BaseWota):
         super().__init__(beats=8, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        self._rising_chase = _rising_chase_steps(self._build_frame())
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        height = count // 2
-
-        q = self._count % 3
-        for i in range(0, 27, 3):
-            x = (i + q) // 9
-            y = (i + q) % 9
-            if x == 0:
-                if y <= height:
-                    color = self.colors[0]
-                else:
-                    color = BladeColor.NONE
-            elif x == 1:
-                color = self.colors[1]
-            elif x == 2:
-                if y <= height:
-                    color = self.colors[2]
-                else:
-                    color = BladeColor.NONE
-            else:
-                color = BladeColor.NONE
-            self.strip.setPixelColor(i + q, color.value)
-        self.strip.show()
-        for i in range(0, 27, 3):
-            self.strip.setPixelColor(i + q, BladeColor.NONE.value)
+        count = self._count % self._period
+
+        # left and right blades rise by one pixel every two ticks
+        self._show_pixels(self._rising_chase[min(count // 2, 8)][self._count % 3])
 
-        self._count += 1
+        self._count = (self._count + 1) % self._count_wrap
 
 
 class WotaHPTIntroFu(BaseWota):
@@ -1165,30 +1078,17 @@ class WotaHPTIntroFu(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        self._set_actions({
+            0: self.all_off,
+            12: self._show(_blades_on(frame, (0,))),
+            20: self._show(_blades_on(frame, (1,))),
+            28: self._show(_blades_on(frame, (2,))),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            self.all_off()
-        elif count == 12:
-            color = self.colors[0]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(0, y), color.value)
-            self.strip.show()
-        elif count == 20:
-            color = self.colors[1]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 28:
-            color = self.colors[2]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(2, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaHPTSyncoFu(BaseWota):
@@ -1198,30 +1098,16 @@ class WotaHPTSyncoFu(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        self._set_actions({
+            0: self._show(_rows_on(frame, range(3)) + _rows_off(range(3, 9))),
+            12: self._show(_rows_on(frame, range(3, 6))),
+            20: self._show(_rows_on(frame, range(6, 9))),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                for y in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                for y in range(3, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 12:
-            for x, color in enumerate(self.colors):
-                for y in range(3, 6):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 20:
-            for x, color in enumerate(self.colors):
-                for y in range(6, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaHPTFufufu(BaseWota):
@@ -1231,31 +1117,16 @@ class WotaHPTFufufu(BaseWota):
         super().__init__(beats=2, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        self._set_actions({
+            0: self._show(_blades_on(frame, (0,)) + _blades_off((1, 2))),
+            4: self._show(_blades_on(frame, (1,))),
+            8: self._show(_blades_on(frame, (2,))),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            color = self.colors[0]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(0, y), color.value)
-            for x in range(1, 3):
-                for y in range(9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 4:
-            color = self.colors[1]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 8:
-            color = self.colors[2]
-            for y in range(9):
-                self.strip.setPixelColor(pixel_index(2, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaKoiNiFufu(BaseWota):
@@ -1266,27 +1137,19 @@ class WotaKoiNiFufu(BaseWota):
         self.colors = (left, center, right)
         self._count = 0
         self.reverse = reverse
+        frame = self._build_frame()
+        if reverse:
+            first = _blades_off((0,)) + _blades_on(frame, (1,)) + _blades_off((2,))
+        else:
+            first = _blades_on(frame, (0,)) + _blades_off((1,)) + _blades_on(frame, (2,))
+        self._set_actions({
+            0: self._show(first),
+            4: self._show(_frame_pixels(frame)),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            if self.reverse:
-                colors = (BladeColor.NONE, self.colors[1], BladeColor.NONE)
-            else:
-                colors = (self.colors[0], BladeColor.NONE, self.colors[2])
-            for x, color in enumerate(colors):
-                for y in range(9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 4:
-            for x, color in enumerate(self.colors):
-                for y in range(9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaKoiNiTottemo(BaseWota):
@@ -1296,32 +1159,17 @@ class WotaKoiNiTottemo(BaseWota):
         super().__init__(beats=2, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        self._set_actions({
+            0: self._show(_rows_on(frame, range(3)) + _rows_off(range(3, 9))),
+            4: self._show(_rows_on(frame, range(3, 6))),
+            6: self._show(_rows_on(frame, range(6, 9))),
+            15: self.all_off,
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                for y in range(0, 3):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                for y in range(3, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 4:
-            for x, color in enumerate(self.colors):
-                for y in range(3, 6):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 6:
-            for x, color in enumerate(self.colors):
-                for y in range(6, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 15:
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaKoiNiOpen(BaseWota):
@@ -1334,20 +1182,12 @@ class WotaKoiNiOpen(BaseWota):
         super().__init__(beats=1, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: full, 4: self.all_off, 5: full})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 5):
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 4:
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaATPSeichou(BaseWota):
@@ -1358,55 +1198,25 @@ class WotaATPSeichou(BaseWota):
         super().__init__(beats=6, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
-
-    def tick(self, loop=False, **kwargs):
-        """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 40):
-            self.all_off()
-        elif count == 4:
+        frame = self._build_frame()
+        self._set_actions({
+            0: self.all_off,
             # sei
-            for y in range(9):
-                color = self.colors[0]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(0, y), color.value)
-            self.strip.show()
-        elif count == 12:
+            4: self._show(_blades_on(frame, (0,))),
             # cho-
-            for y in range(9):
-                color = self.colors[2]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(2, y), color.value)
-            self.strip.show()
-        elif count == 20:
+            12: self._show(_blades_on(frame, (2,))),
             # shi-
-            for y in range(3):
-                color = self.colors[1]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 24:
+            20: self._show(_blades_on(frame, (1,), range(3))),
             # -ta
-            for y in range(3, 6):
-                color = self.colors[1]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 28:
+            24: self._show(_blades_on(frame, (1,), range(3, 6))),
             # ne
-            for y in range(6, 9):
-                color = self.colors[1]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
+            28: self._show(_blades_on(frame, (1,), range(6, 9))),
+            40: self.all_off,
+        })
 
-        self._count += 1
+    def tick(self, loop=False, **kwargs):
+        """Perform one tick from this pattern."""
+        self._tick_actions()
 
 
 class WotaATPFighting(BaseWota):
@@ -1417,47 +1227,22 @@ class WotaATPFighting(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
-
-    def tick(self, loop=False, **kwargs):
-        """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
+        frame = self._build_frame()
+        self._set_actions({
             # figh-
-            for y in range(9):
-                color = self.colors[0]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(0, y), color.value)
-            self.strip.show()
-        elif count == 6:
+            0: self._show(_blades_on(frame, (0,))),
             # -ting
-            for y in range(9):
-                color = self.colors[2]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(2, y), color.value)
-            self.strip.show()
-        elif count == 12:
+            6: self._show(_blades_on(frame, (2,))),
             # figh-
-            for y in range(5):
-                color = self.colors[1]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 20:
+            12: self._show(_blades_on(frame, (1,), range(5))),
             # -ting
-            for y in range(5, 9):
-                color = self.colors[1]
-                if isinstance(color, tuple):
-                    color = color[y % len(color)]
-                self.strip.setPixelColor(pixel_index(1, y), color.value)
-            self.strip.show()
-        elif count == 31:
-            self.all_off()
+            20: self._show(_blades_on(frame, (1,), range(5, 9))),
+            31: self.all_off,
+        })
 
-        self._count += 1
+    def tick(self, loop=False, **kwargs):
+        """Perform one tick from this pattern."""
+        self._tick_actions()
 
 
 class WotaYumeFufu(BaseWota):
@@ -1467,20 +1252,12 @@ class WotaYumeFufu(BaseWota):
         super().__init__(beats=2, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: self.all_off, 4: full, 7: self.all_off, 8: full, 15: self.all_off})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 7, 15):
-            self.all_off()
-        elif count in (4, 8):
-            for x, color in enumerate(self.colors):
-                for y in range(0, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaYumeFufufu(BaseWota):
@@ -1493,21 +1270,17 @@ class WotaYumeFufufu(BaseWota):
         super().__init__(beats=5, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        left_chase = self._chase_action(center=False, right=False)
+        right_chase = self._chase_action(left=False, center=False)
+        actions = {count: left_chase for count in range(4, 12)}
+        actions.update((count, right_chase) for count in range(12, 20))
+        actions.update((count, left_chase) for count in range(20, 40))
+        actions.update((count, self.all_off) for count in (0, 39))
+        self._set_actions(actions)
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 39):
-            self.all_off()
-        elif count >= 4 and count < 12:
-            self.light_chase(center=False, right=False)
-        elif count >= 12 and count < 20:
-            self.light_chase(left=False, center=False)
-        elif count >= 20:
-            self.light_chase(center=False, right=False)
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaJimoAi(BaseWota):
@@ -1517,35 +1290,19 @@ class WotaJimoAi(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        self._set_actions({
+            0: self._show(_blades_on(frame, (0,), range(5)) + _blades_off((0,), range(5, 9))
+                          + _blades_on(frame, (1,))
+                          + _blades_off((2,), range(4)) + _blades_on(frame, (2,), range(4, 9))),
+            16: self._show(_blades_off((0,), range(4)) + _blades_on(frame, (0,), range(4, 9))
+                           + _blades_on(frame, (1,))
+                           + _blades_on(frame, (2,), range(5)) + _blades_off((2,), range(5, 9))),
+        })
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            for x, color in enumerate(self.colors):
-                for y in range(9):
-                    c = BladeColor.NONE
-                    if x == 1 or (x == 0 and y <= 4) or (x == 2 and y >= 4):
-                        if isinstance(color, tuple):
-                            c = color[y % len(color)]
-                        else:
-                            c = color
-                    self.strip.setPixelColor(pixel_index(x, y), c.value)
-            self.strip.show()
-        elif count == 16:
-            for x, color in enumerate(self.colors):
-                for y in range(9):
-                    c = BladeColor.NONE
-                    if x == 1 or (x == 0 and y >= 4) or (x == 2 and y <= 4):
-                        if isinstance(color, tuple):
-                            c = color[y % len(color)]
-                        else:
-                            c = color
-                    self.strip.setPixelColor(pixel_index(x, y), c.value)
-            self.strip.show()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaHajimariYamenai(BaseWota):
@@ -1555,34 +1312,20 @@ class WotaHajimariYamenai(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        frame = self._build_frame()
+        chase = self._chase_action()
+        actions = {count: chase for count in range(24, 32)}
+        actions.update({
+            0: self.all_off,
+            4: self._show(_rows_on(frame, range(3)) + _rows_off(range(3, 9))),
+            12: self._show(_rows_on(frame, range(3, 6))),
+            16: self._show(_rows_on(frame, range(6, 9))),
+        })
+        self._set_actions(actions)
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count == 0:
-            self.all_off()
-        elif count == 4:
-            for x, color in enumerate(self.colors):
-                for y in range(3):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-                for y in range(3, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), BladeColor.NONE.value)
-            self.strip.show()
-        elif count == 12:
-            for x, color in enumerate(self.colors):
-                for y in range(3, 6):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count == 16:
-            for x, color in enumerate(self.colors):
-                for y in range(6, 9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count >= 24:
-            self.light_chase()
-
-        self._count += 1
+        self._tick_actions()
 
 
 class WotaHajimariGoEast(BaseWota):
@@ -1592,20 +1335,12 @@ class WotaHajimariGoEast(BaseWota):
         super().__init__(beats=4, *args, **kwargs)
         self.colors = (left, center, right)
         self._count = 0
+        full = self._show(_frame_pixels(self._build_frame()))
+        self._set_actions({0: full, 8: self.all_off, 12: full, 20: self.all_off, 24: full})
 
     def tick(self, loop=False, **kwargs):
         """Perform one tick from this pattern."""
-        count = self._count % len(self)
-
-        if count in (0, 12, 24):
-            for x, color in enumerate(self.colors):
-                for y in range(9):
-                    self.strip.setPixelColor(pixel_index(x, y), color.value)
-            self.strip.show()
-        elif count in (8, 20):
-            self.all_off()
-
-        self._count += 1
+        self._tick_actions()
 
 
 WOTA_TYPE = {
@@ -1646,12 +1381,88 @@ def init_strip():
     return PixelStrip(LED_COUNT, LED_PIN, LED_FREQ_HZ, LED_DMA, LED_INVERT, LED_BRIGHTNESS, LED_CHANNEL)
 
 
-def test_wipe(strip, clear=False):
+class StripWriter(object):
+
+    def __init__(self, strip):
+        """Display frames on a strip from a background writer thread.
+
+        Can be used in place of a PixelStrip. Pixels are buffered, and `show()` hands a snapshot of the buffer to the
+        writer thread and returns immediately instead of waiting for the frame to be sent to the LEDs. If the writer
+        falls behind, only the newest frame is displayed. Calling `show()` without changing any pixels since the last
+        displayed frame does nothing.
+
+        The writer thread must be the only user of the underlying strip until `close()` is called.
+
+        Parameters:
+            strip (PixelStrip): The (initialized) ws281x strip to write to.
+
+        """
+        self.strip = strip
+        self._pixels = [_NONE] * strip.numPixels()
+        self._last_frame = None
+        self._frames = queue.Queue(maxsize=1)
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def numPixels(self):
+        return len(self._pixels)
+
+    def setPixelColor(self, n, color):
+        self._pixels[n] = color
+
+    def show(self):
+        frame = tuple(self._pixels)
+        if frame == self._last_frame:
+            return
+        self._last_frame = frame
+        try:
+            # drop a frame the writer has not gotten to yet
+            self._frames.get_nowait()
+        except queue.Empty:
+            pass
+        self._frames.put_nowait(frame)
+
+    def close(self, timeout=1):
+        """Wait for the last frame to be displayed and stop the writer thread.
+
+        Gives up after `timeout` seconds if the writer thread is stuck, so that closing never blocks the caller
+        indefinitely.
+
+        """
+        try:
+            self._frames.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning('LED writer thread did not take the last frame, not waiting for it to stop')
+            return
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning('LED writer thread did not stop within %ss', timeout)
+
+    def _run(self):
+        set_pixel = self.strip.setPixelColor
+        while True:
+            frame = self._frames.get()
+            if frame is None:
+                return
+            # a failed write only loses this frame, the writer keeps draining the queue so that show() and close()
+            # never wait on a dead thread
+            try:
+                for i, value in enumerate(frame):
+                    set_pixel(i, value)
+                self.strip.show()
+            except Exception:
+                logger.exception('Error writing frame to LED strip')
+
+
+def test_wipe(strip, clear=False, cancel=None):
     try:
         logger.info('Test color wipe animations.')
         for color in BladeColor:
             logger.debug(color)
-            color_wipe(strip, color.value)
+            color_wipe(strip, color.value, cancel=cancel)
+            if cancel is not None and cancel.is_set():
+                # whoever cancelled the wipe takes over the strip
+                return
         if clear:
             color_wipe(strip, Color(0, 0, 0), 10)
     except KeyboardInterrupt:
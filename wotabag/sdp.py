@@ -6,7 +6,9 @@ import itertools
 import logging
 import math
 import struct
-from queue import Queue
+import time
+from collections import deque
+from threading import Event
 
 from tinyrpc.transports import ServerTransport
 
@@ -19,10 +21,20 @@ logger = logging.getLogger('wotabag')
 # MTU_SIZE = 185
 MTU_SIZE = 48
 
+# Datagram header: key (1 byte), offset (4 bytes), message length (4 bytes)
+_HEADER = struct.Struct('!BII')
+
+# Largest message that will be reassembled, so that a bogus header cannot
+# allocate an arbitrarily large message buffer
+MAX_MESSAGE_LENGTH = 64 * 1024
+
+# Seconds after which an incomplete message is discarded
+MESSAGE_TIMEOUT = 30
+
 
 class DatagramHeader(object):
 
-    BYTE_COUNT = 9
+    BYTE_COUNT = _HEADER.size
 
     def __init__(self, key, offset, message_length):
         self.key = key
@@ -33,7 +45,7 @@ class DatagramHeader(object):
         return hash((self.key, self.offset, self.message_length))
 
     def __bytes__(self):
-        return struct.pack('!BII', self.key, self.offset, self.message_length)
+        return _HEADER.pack(self.key, self.offset, self.message_length)
 
 
 class Datagram(object):
@@ -53,12 +65,17 @@ class Datagram(object):
 
     @classmethod
     def decode(cls, data):
+        """Decode a received datagram.
+
+        The payload is a memoryview into `data` rather than a copy.
+
+        """
         try:
-            key, offset, message_length = struct.unpack_from('!BII', data)
+            key, offset, message_length = _HEADER.unpack_from(data)
         except struct.error:
             return None
         hdr = DatagramHeader(key, offset, message_length)
-        return Datagram(hdr, data[DatagramHeader.BYTE_COUNT:])
+        return Datagram(hdr, memoryview(data)[DatagramHeader.BYTE_COUNT:])
 
 
 class DatagramView(object):
@@ -91,64 +108,167 @@ class Message(object):
 class MessageBuilder(object):
 
     def __init__(self, message_length, on_complete=None):
-        self.remaining_indices = set(range(0, message_length))
-        self._data = list([b'\x00'] * message_length)
+        self._data = bytearray(message_length)
+        # non-zero for every byte received so far, so that duplicate or overlapping datagrams are not counted twice
+        self._received = bytearray(message_length)
+        self.remaining = message_length
         self.message_length = message_length
         self.on_complete = on_complete
+        self.created = time.monotonic()
 
     @property
     def data(self):
         return bytes(self._data)
 
     def insert(self, payload, offset):
-        for i in range(len(payload)):
-            data_index = offset + i
-            self._data[data_index] = payload[i]
-            self.remaining_indices.remove(data_index)
-        if not self.remaining_indices:
+        end = offset + len(payload)
+        if end > self.message_length:
+            raise ValueError('Datagram payload exceeds message length')
+        new = self._received.count(0, offset, end)
+        if not new:
+            return
+        self._received[offset:end] = b'\x01' * (end - offset)
+        self._data[offset:end] = payload
+        self.remaining -= new
+        if not self.remaining:
             if self.on_complete:
                 self.on_complete(self.data)
 
 
+class MessageQueue(deque):
+    """Lock-free queue of assembled SDP messages.
+
+    deque appends and pops are atomic, so no lock is needed for single producer/single consumer use. `get()` does not
+    block, consumers should check `empty()` first.
+
+    """
+
+    def empty(self):
+        return not self
+
+    def put(self, item):
+        self.append(item)
+
+    def get(self):
+        return self.popleft()
+
+
 class SDPServerTransport(ServerTransport):
     """SDP tinyrpc server transport."""
 
-    def __init__(self, queue_class=Queue):
+    def __init__(self, queue_class=MessageQueue):
         self._queue_class = queue_class
         self.messages = self._queue_class()
         # self.replies = self._queue_class()
         self.builders = {}
+        # raw datagrams received from BLE, waiting to be reassembled by `process_pending()`
+        self._datagrams = deque()
+        self._pending = Event()
         self._key_iter = itertools.count()
         self.reply_callback = None
 
     def receive_message(self):
-        msg = self.messages.get()
-        return msg
+        """Wait for the next complete message.
+
+        Datagrams are reassembled in the calling thread while waiting.
+
+        """
+        while True:
+            self.process_pending()
+            if not self.messages.empty():
+                return self.messages.get()
+            self._wait()
+
+    def _wait(self):
+        """Block until `_notify()` is called."""
+        self._pending.wait()
+        self._pending.clear()
+
+    def _notify(self):
+        """Wake up `receive_message()`, called after a datagram has been queued."""
+        self._pending.set()
 
     def send_reply(self, context, reply):
-        logger.debug('Sending RPC response: {}'.format(reply.decode('utf-8')))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Sending RPC response: %s', reply.decode('utf-8', errors='replace'))
         if not self.reply_callback:
             logger.debug('Reply callback is not set, cannot send RPC response.')
             return
-        key = next(self._key_iter)
-        response = Message(key, reply)
-        for dgram in response.datagrams():
-            if callable(self.reply_callback):
-                self.reply_callback(bytes(dgram))
+        if not callable(self.reply_callback):
+            return
+        # message keys are sent as a single byte
+        key = next(self._key_iter) & 0xff
+        # equivalent to sending each of Message(key, reply).datagrams(), but every datagram is packed into the same
+        # buffer instead of building Datagram objects
+        reply_len = len(reply)
+        payload_max_size = MTU_SIZE - DatagramHeader.BYTE_COUNT
+        reply = memoryview(reply)
+        buf = bytearray(MTU_SIZE)
+        view = memoryview(buf)
+        for offset in range(0, reply_len, payload_max_size):
+            payload = reply[offset:offset + payload_max_size]
+            end = DatagramHeader.BYTE_COUNT + len(payload)
+            _HEADER.pack_into(buf, 0, key, offset, reply_len)
+            view[DatagramHeader.BYTE_COUNT:end] = payload
+            self.reply_callback(bytes(view[:end]))
 
     def handle_message(self, data):
         """Handle an assembled SDP message."""
-        logger.debug('Got RPC request: "{}"'.format(data.decode('utf-8')))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug('Got RPC request: "%s"', data.decode('utf-8', errors='replace'))
         self.messages.put((None, data))
 
     def process(self, data):
+        """Queue a partial SDP message.
+
+        Called from the BLE (dbus/glib) thread. Reassembly is left to `process_pending()`, so that the BLE stack's
+        dispatch is not held up by it.
+
+        """
+        self._datagrams.append(data)
+        self._notify()
+
+    def process_pending(self):
+        """Reassemble all queued datagrams.
+
+        Called by `receive_message()` before it checks for new messages. A datagram which cannot be processed is logged
+        and dropped, so that bad client data never ends the RPC server loop.
+
+        """
+        datagrams = self._datagrams
+        while datagrams:
+            data = datagrams.popleft()
+            try:
+                self._process_datagram(data)
+            except Exception:
+                logger.exception('Error processing SDP datagram %r', data)
+
+    def _process_datagram(self, data):
         """Process a partial SDP message."""
-        dgram = Datagram.decode(data)
-        key = dgram.header.key
-        message_length = dgram.header.message_length
-        builder = self.builders.get(key, MessageBuilder(message_length, on_complete=self.handle_message))
-        builder.insert(dgram.payload, dgram.header.offset)
-        if builder.remaining_indices:
+        try:
+            key, offset, message_length = _HEADER.unpack_from(data)
+        except struct.error:
+            logger.warning('Dropping truncated SDP datagram')
+            return
+        payload = memoryview(data)[DatagramHeader.BYTE_COUNT:]
+        if (message_length > MAX_MESSAGE_LENGTH or offset + len(payload) > message_length
+                or (message_length and offset >= message_length)):
+            logger.warning('Dropping invalid SDP datagram (offset %d, message length %d)', offset, message_length)
+            return
+        builder = self.builders.get(key)
+        if builder is None or builder.message_length != message_length:
+            self._expire_builders()
+            builder = MessageBuilder(message_length, on_complete=self.handle_message)
+        builder.insert(payload, offset)
+        if builder.remaining:
             self.builders[key] = builder
         elif key in self.builders:
             del self.builders[key]
+
+    def _expire_builders(self):
+        """Discard incomplete messages which have not been finished within MESSAGE_TIMEOUT."""
+        now = time.monotonic()
+        for key, builder in list(self.builders.items()):
+            if now - builder.created > MESSAGE_TIMEOUT:
+                logger.debug('Discarding incomplete SDP message %d', key)
+                del self.builders[key]
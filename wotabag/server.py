@@ -10,10 +10,11 @@ import enum
 import logging
 import logging.config
 import logging.handlers
+import os
 import subprocess
 import time
 from io import IOBase
-from threading import Event, Thread, Semaphore
+from threading import Event, Lock, Thread
 
 import dbus
 import dbus.mainloop.glib
@@ -31,6 +32,7 @@ from gevent.pywsgi import WSGIServer
 from mpv import MPV
 
 from ruamel.yaml import YAML
+from ruamel.yaml.error import YAMLError
 
 from tinyrpc.exc import BadRequestError
 from tinyrpc.protocols.jsonrpc import JSONRPCProtocol
@@ -47,8 +49,10 @@ from .led import (
     muse,
     muse_units,
     BladeColor,
+    fill_strip,
     init_strip,
-    pixel_index,
+    show_frame,
+    StripWriter,
     test_wipe,
     WOTA_TYPE,
 )
@@ -56,6 +60,110 @@ from .led import (
 from .sdp import SDPServerTransport
 
 
+# time.sleep() may wake up late by around a millisecond, so the playback loop
+# only sleeps until this long before a tick deadline and spins for the rest
+TICK_SPIN_NS = 1000000
+
+
+def sleep_until(deadline_ns, stop_event=None):
+    """Block until time.perf_counter_ns() reaches deadline_ns.
+
+    If stop_event (threading.Event) is given, returns True as soon as it is set instead of waiting for the deadline.
+
+    """
+    remaining = deadline_ns - time.perf_counter_ns()
+    if remaining > TICK_SPIN_NS:
+        timeout = (remaining - TICK_SPIN_NS) / 1e9
+        if stop_event is None:
+            time.sleep(timeout)
+        elif stop_event.wait(timeout):
+            return True
+    while time.perf_counter_ns() < deadline_ns:
+        pass
+    return False
+
+
+# Seconds between checks for a stop request while the playback thread waits on mpv
+STOP_CHECK_INTERVAL = 0.05
+
+
+def wait_unless_stopped(wait, timeout, stop_event):
+    """Call wait(interval) repeatedly until it returns True, stop_event is set or timeout seconds have passed.
+
+    Used for waits which cannot be interrupted by stop_event directly (mpv events), so that stopping playback does
+    not wait out the full timeout.
+
+    Returns:
+        bool: The result of the last wait() call.
+
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        remaining = deadline - time.monotonic()
+        if wait(max(0, min(STOP_CHECK_INTERVAL, remaining))):
+            return True
+        if stop_event.is_set() or remaining <= STOP_CHECK_INTERVAL:
+            return False
+
+
+# Real-time priority given to the playback thread
+PLAYBACK_PRIORITY = 10
+
+
+def set_playback_priority():
+    """Schedule the calling thread with real-time priority, so that LED ticks are not delayed by other threads.
+
+    Falls back to a raised nice value if real-time scheduling is unavailable (requires root or CAP_SYS_NICE).
+
+    Threads started by the calling thread afterwards inherit its scheduling policy, so only threads which should run
+    in real time as well (the StripWriter thread) should be created after calling this.
+
+    """
+    logger = logging.getLogger('wotabag')
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(PLAYBACK_PRIORITY))
+        return
+    except (AttributeError, OSError) as e:
+        logger.debug('Could not set SCHED_FIFO for playback thread: %s', e)
+    try:
+        # on Linux, nice() only applies to the calling thread
+        os.nice(-10)
+    except OSError as e:
+        logger.debug('Could not raise playback thread priority: %s', e)
+
+
+# BladeColor members by (upper case) name
+_BLADE_COLORS = dict(BladeColor.__members__)
+
+
+def _blade_color(name):
+    """Return the BladeColor for a color name, or None for an unknown name."""
+    if not isinstance(name, str):
+        raise ValueError('Invalid color {!r}'.format(name))
+    return _BLADE_COLORS.get(name.upper())
+
+
+def _pattern_colors(pattern):
+    """Return the blade colors set by a song pattern entry, keyed by blade.
+
+    Unknown color names are ignored.
+
+    Raises:
+        ValueError: A color is not a name or a list of names.
+
+    """
+    colors = {}
+    for k in ('left', 'center', 'right'):
+        if k in pattern:
+            if isinstance(pattern[k], list):
+                colors[k] = tuple(color for color in map(_blade_color, pattern[k]) if color is not None)
+            else:
+                color = _blade_color(pattern[k])
+                if color is not None:
+                    colors[k] = color
+    return colors
+
+
 @enum.unique
 class WotabagStatus(enum.IntEnum):
 
@@ -86,8 +194,9 @@ class WotabagManager(object):
             volume = 0
         self.volume = volume
         self.current_track = 0
+        # status is only ever replaced with a single attribute store, so it
+        # does not need a lock
         self.status = WotabagStatus.IDLE
-        self._status_lock = Semaphore()
 
         # init LED strip
         self.strip = init_strip()
@@ -96,9 +205,16 @@ class WotabagManager(object):
         # init playback
         self.player = None
         self.song = None
+        self._song_patterns = None
         self._stopped = Event()
         self._stopped.set()
         self._playback_thread = None
+        self._playback_control_lock = Lock()
+        # held by whoever is currently writing to self.strip (playback thread,
+        # test wipe, set_color or the clear on stop)
+        self._strip_lock = Lock()
+        # cancels the running test wipe, if any
+        self._wipe_cancel = None
 
     def __enter__(self):
         return self
@@ -122,30 +238,109 @@ class WotabagManager(object):
             'trace': self.logger.debug,
         }
         if loglevel in f:
-            f[loglevel]('[MPV] {}: {}'.format(component, message))
+            f[loglevel]('[MPV] %s: %s', component, message)
 
-    def _load_file(self, yaml_file):
-        yaml = YAML(typ='safe')
+    def _read_song(self, yaml_file, yaml=None):
+        """Parse a song file and cache the result.
+
+        Returns:
+            tuple: The parsed song, and a (wota class, colors) tuple for each entry in its pattern list.
+
+        Raises:
+            ValueError: The song is missing a required field, or has an invalid pattern entry.
+
+        """
+        if yaml is None:
+            yaml = YAML(typ='safe')
         with open(yaml_file) as f:
             song = yaml.load(f)
-        self.logger.debug('loaded {} ({})'.format(song['title'], song['filename']))
+        if not isinstance(song, dict):
+            raise ValueError('Song file does not contain a mapping')
+        for k in ('title', 'filename'):
+            if k not in song:
+                raise ValueError('Song has no {}'.format(k))
+        if not isinstance(song.get('patterns'), list):
+            raise ValueError('Song has no pattern list')
+        # look up pattern classes and colors once here rather than when playback starts
+        patterns = []
+        for pattern in song['patterns']:
+            if not isinstance(pattern, dict):
+                raise ValueError('Invalid pattern entry {!r}'.format(pattern))
+            wota_type = WOTA_TYPE.get(pattern.get('type'))
+            if wota_type is None:
+                raise ValueError('Unknown pattern type {!r}'.format(pattern.get('type')))
+            patterns.append((wota_type, _pattern_colors(pattern)))
+        self._songs[yaml_file] = (song, patterns)
+        return song, patterns
+
+    def _load_file(self, yaml_file):
+        cached = self._songs.get(yaml_file)
+        if cached is None:
+            cached = self._read_song(yaml_file)
+        song, self._song_patterns = cached
+        self.logger.debug('loaded %s (%s)', song['title'], song['filename'])
         self.song = song
 
+    def _compile_song(self, strip):
+        """Create the wota patterns for the current song.
+
+        Colors and bpm are applied for every entry in the song's pattern list before playback starts, so that none
+        of this work is done between ticks.
+
+        Returns:
+            list: (wota, count) tuples, in playback order.
+
+        """
+        bpm = 120
+        cur_colors = {
+            'left': BladeColor.YOSHIKO,
+            'center': BladeColor.YOSHIKO,
+            'right': BladeColor.YOSHIKO,
+        }
+        plan = []
+        for pattern, (wota_type, colors) in zip(self.song['patterns'], self._song_patterns):
+            if 'bpm' in pattern:
+                bpm = pattern['bpm']
+            cur_colors.update(colors)
+            kwargs = dict(pattern.get('kwargs', {}))
+            kwargs.update(cur_colors)
+            wota = wota_type(bpm=bpm, strip=strip, **kwargs)
+            plan.append((wota, pattern.get('count', 1)))
+        return plan
+
     def _load_playlist(self, playlist):
         yaml = YAML(typ='safe')
         self.playlist = []
+        # parsed songs, keyed by file name, so that starting playback does not re-parse the song file
+        self._songs = {}
         for yaml_file in playlist:
-            with open(yaml_file) as f:
-                song = yaml.load(f)
-                self.playlist.append((yaml_file, song['title']))
+            try:
+                song, _ = self._read_song(yaml_file, yaml)
+            except (OSError, YAMLError, ValueError) as e:
+                self.logger.error('Skipping playlist song %s: %s', yaml_file, e)
+                continue
+            self.playlist.append((yaml_file, song['title']))
+
+    def _run_playback_control(self, func, *args):
+        """Run a blocking playback control function outside of the RPC event loop.
+
+        Starting and stopping playback waits on the playback thread and mpv, so
+        it is run in the gevent threadpool to keep the RPC greenlets responsive.
+
+        """
+        def run():
+            with self._playback_control_lock:
+                return func(*args)
 
-    def _play(self):
+        return gevent.get_hub().threadpool.apply(run)
+
+    def _play(self, index=None):
+        if index is not None:
+            self.current_track = index
         self._stop()
         self._stopped.clear()
 
-        self._status_lock.acquire()
         self.status = WotabagStatus.PLAYING
-        self._status_lock.release()
 
         self._playback_thread = Thread(target=self._wota_playback)
         self.logger.debug('starting wota playback thread')
@@ -162,108 +357,136 @@ class WotabagManager(object):
             self.player = None
         self.song = None
 
-        for i in range(self.strip.numPixels()):
-            self.strip.setPixelColor(i, BladeColor.NONE.value)
-        self.strip.show()
+        self._cancel_wipe()
+        with self._strip_lock:
+            fill_strip(self.strip, BladeColor.NONE.value)
 
-        self._status_lock.acquire()
         self.status = WotabagStatus.IDLE
-        self._status_lock.release()
 
     def _wota_playback(self):
+        # one mpv instance is used for every song in this playback run, each
+        # song is loaded into it in place of the previous one. It is created
+        # before raising this thread's priority, so that mpv's own threads do
+        # not inherit real-time scheduling and compete with the tick loop.
+        if self.player:
+            self.player.terminate()
+        self.player = MPV(vid='no', hwdec='mmal', volume=self.volume, log_handler=self._mpv_log)
+        set_playback_priority()
+        # LED frames are sent to the strip from a writer thread, so that waiting
+        # for each frame to be transmitted does not delay the next tick
+        with self._strip_lock:
+            strip = StripWriter(self.strip)
+            try:
+                self._play_songs(strip)
+            finally:
+                strip.close()
+
+    def _cancel_wipe(self):
+        """Stop a running test wipe, so that the strip lock is released shortly."""
+        cancel = self._wipe_cancel
+        if cancel is not None:
+            cancel.set()
+
+    def _test_wipe(self, cancel):
+        # a cancelled wipe gives up the strip within one wipe step
+        if not self._strip_lock.acquire(timeout=1):
+            self.logger.warning('LEDs are in use, skipping test pattern')
+            return
+        try:
+            if not cancel.is_set():
+                test_wipe(self.strip, clear=True, cancel=cancel)
+        finally:
+            self._strip_lock.release()
+
+    def _set_color(self, colors):
+        self._cancel_wipe()
+        if not self._strip_lock.acquire(timeout=1):
+            raise BadRequestError('Cannot set color during playback')
+        try:
+            strip = self.strip
+            if len(colors) == 1:
+                fill_strip(strip, colors[0].value)
+            elif len(colors) <= 3:
+                if len(colors) == 2:
+                    colors = colors + (colors[0],)
+                # pixels are indexed blade by blade (pixel_index(x, y) == 9 * x + y)
+                show_frame(strip, [color.value for color in colors for y in range(9)])
+            elif len(colors) == 9:
+                show_frame(strip, [color.value for color in colors] * 3)
+        finally:
+            self._strip_lock.release()
+
+    def _play_songs(self, strip):
+        started = Event()
+
+        @self.player.event_callback('playback-restart')
+        def playback_started(event):
+            started.set()
+
         while self.current_track < len(self.playlist):
             song, _ = self.playlist[self.current_track]
             self._load_file(song)
+            plan = self._compile_song(strip)
 
-            if self.player:
-                self.player.terminate()
-            self.player = MPV(vid='no', hwdec='mmal', keep_open='yes', volume=self.volume, log_handler=self._mpv_log)
+            started.clear()
             self.player.play(self.song['filename'])
 
             # wait for mpv to actually start playing
-            playback_lock = Semaphore(value=0)
-
-            def observer(name, val):
-                if val is not None:
-                    playback_lock.release()
-
-            self.player.observe_property('time-pos', observer)
-            playback_lock.acquire()
-            self.player.unobserve_property('time-pos', observer)
+            if not wait_unless_stopped(started.wait, 5, self._stopped):
+                if self._stopped.is_set():
+                    return
+                self.logger.warning('Timed out waiting for mpv to start playback')
 
             start = time.time()
             ticks = 0
             # drift = 0
-            bpm = 120
-            cur_colors = {
-                'left': BladeColor.YOSHIKO,
-                'center': BladeColor.YOSHIKO,
-                'right': BladeColor.YOSHIKO,
-            }
 
             initial_offset = self.song.get('initial_offset', 0)
             if initial_offset:
-                time.sleep((start + initial_offset / 1000) - time.time())
+                if self._stopped.wait(max(0, (start + initial_offset / 1000) - time.time())):
+                    return
 
-            last_tick = time.perf_counter()
+            stopped = self._stopped.is_set
+            last_tick = time.perf_counter_ns()
             # play led patterns
-            for pattern in self.song['patterns']:
-                if 'bpm' in pattern:
-                    bpm = pattern['bpm']
-                for k in ['left', 'center', 'right']:
-                    if k in pattern:
-                        if isinstance(pattern[k], list):
-                            colors = []
-                            for c in pattern[k]:
-                                color = c.upper()
-                                if color in BladeColor.__members__:
-                                    colors.append(BladeColor[color])
-                            cur_colors[k] = tuple(colors)
-                        else:
-                            color = pattern[k].upper()
-                            if color in BladeColor.__members__:
-                                cur_colors[k] = BladeColor[color]
-                kwargs = pattern.get('kwargs', {})
-                kwargs.update(cur_colors)
-                wota = WOTA_TYPE[pattern['type']](bpm=bpm, strip=self.strip, **kwargs)
-                count = pattern.get('count', 1)
+            for wota, count in plan:
+                tick = wota.tick
+                tick_ns = round(wota.tick_s * 1e9)
                 for i in range(count):
                     for _ in range(len(wota)):
-                        if self._stopped.is_set():
+                        if stopped():
                             return
-                        next_tick = last_tick + wota.tick_s
+                        next_tick = last_tick + tick_ns
                         # if i == 0 or i == count - 1:
                         #     loop = False
                         # else:
                         #     loop = True
                         loop = True
-                        wota.tick(loop=loop)
-                        diff = next_tick - time.perf_counter()
+                        tick(loop=loop)
+                        # deadlines are always advanced from the previous
+                        # deadline, so late wakeups do not accumulate drift
                         last_tick = next_tick
-                        # drift = 0
-                        if diff > 0:
-                            time.sleep(diff)
-                        # elif diff < 0:
-                        #     drift = diff
+                        if sleep_until(next_tick, self._stopped):
+                            return
                         ticks += 1
 
             with self.player._playback_cond:
                 # wait for mpv to reach the end of the audio file or 5 seconds,
                 # whichever comes first
-                self.player._playback_cond.wait(5)
+                wait_unless_stopped(self.player._playback_cond.wait, 5, self._stopped)
+            if self._stopped.is_set():
+                return
 
             # end of song, setup next track
-            self.player.terminate()
-            self.player = None
-            for i in range(self.strip.numPixels()):
-                self.strip.setPixelColor(i, BladeColor.NONE.value)
-            self.strip.show()
+            fill_strip(strip, BladeColor.NONE.value)
             self.current_track += 1
 
+        # the playlist is done, rewind it before the (slow) mpv shutdown so
+        # that get_status never sees a track index past the end of it
         self.current_track = 0
-        self._status_lock.acquire()
         self.status = WotabagStatus.IDLE
-        self._status_lock.release()
+        self.player.terminate()
+        self.player = None
 
     @public
     def get_playlist(self):
@@ -275,25 +498,26 @@ class WotabagManager(object):
     def get_status(self):
         """Return current status."""
         self.logger.info('[RPC] wotabag.get_status')
+        # playback may change these while the result is built, so the track
+        # index may briefly point past the end of the playlist
+        status = self.status
+        current_track = self.current_track
+
+        def title(index):
+            if 0 <= index < len(self.playlist):
+                _, track_title = self.playlist[index]
+                return track_title
+            return None
+
         result = {
-            'status': self.status.name,
+            'status': status.name,
             'volume': self.volume,
         }
-        if self.status == WotabagStatus.IDLE:
-            if self.playlist:
-                _, title = self.playlist[self.current_track]
-                result['next_track'] = title
-            else:
-                result['next_track'] = None
-        elif self.status == WotabagStatus.PLAYING:
-            _, title = self.playlist[self.current_track]
-            result['current_track'] = title
-            next_track = self.current_track + 1
-            if next_track < len(self.playlist):
-                _, title = self.playlist[next_track]
-                result['next_track'] = title
-            else:
-                result['next_track'] = None
+        if status == WotabagStatus.IDLE:
+            result['next_track'] = title(current_track)
+        elif status == WotabagStatus.PLAYING:
+            result['current_track'] = title(current_track)
+            result['next_track'] = title(current_track + 1)
         return result
 
     @public
@@ -305,7 +529,7 @@ class WotabagManager(object):
     @public
     def set_volume(self, volume):
         """Set volume."""
-        self.logger.info('[RPC] wotabag.set_volume {}'.format(volume))
+        self.logger.info('[RPC] wotabag.set_volume %s', volume)
         volume = int(volume)
         if volume > 100:
             volume = 100
@@ -329,7 +553,7 @@ class WotabagManager(object):
     @public
     def set_color(self, color):
         """Set all LEDs to the specified color or color sequence."""
-        self.logger.info('[RPC] wotabag.set_color {}'.format(color))
+        self.logger.info('[RPC] wotabag.set_color %s', color)
         if color == 'Aqours Rainbow':
             colors = aqours_rainbow
         elif color in aqours_units:
@@ -343,23 +567,8 @@ class WotabagManager(object):
         else:
             raise BadRequestError('Unknown color')
 
-        strip = self.strip
-        if len(colors) == 1:
-            for i in range(strip.numPixels()):
-                strip.setPixelColor(i, colors[0].value)
-            strip.show()
-        elif len(colors) <= 3:
-            if len(colors) == 2:
-                colors = colors + (colors[0],)
-            for x, color in (enumerate(colors)):
-                for y in range(9):
-                    strip.setPixelColor(pixel_index(x, y), color.value)
-            strip.show()
-        elif len(colors) == 9:
-            for x in range(3):
-                for y, color in enumerate(colors):
-                    strip.setPixelColor(pixel_index(x, y), color.value)
-            strip.show()
+        # waits for the strip lock, so it must not run on the hub
+        self._run_playback_control(self._set_color, colors)
 
     @public
     def power_off(self):
@@ -372,11 +581,10 @@ class WotabagManager(object):
 
         """
         self.logger.info('[RPC] wotabag.power_off')
-        # clear led's before power off otherwise they will stay turned on until
-        # the separate led battery source is manually switched off
-        for i in range(self.strip.numPixels()):
-            self.strip.setPixelColor(i, BladeColor.NONE.value)
-        self.strip.show()
+        # stop playback and clear led's before power off otherwise they will
+        # stay turned on until the separate led battery source is manually
+        # switched off
+        self._run_playback_control(self._stop)
         proc = subprocess.run(['shutdown', '-h', 'now'])
         return proc.returncode
 
@@ -384,42 +592,71 @@ class WotabagManager(object):
     def play(self):
         """Start playback of the next song."""
         self.logger.info('[RPC] wotabag.play')
-        self._play()
+        self._run_playback_control(self._play)
 
     @public
     def play_index(self, index):
         """Start playback of the specified song."""
-        self.logger.info('[RPC] wotabag.play_index {}'.format(index))
+        self.logger.info('[RPC] wotabag.play_index %s', index)
         if index >= len(self.playlist) or index < 0:
             raise BadRequestError('Invalid song index')
-        self.current_track = index
-        self._play()
+        self._run_playback_control(self._play, index)
 
     @public
     def stop(self):
         """Stop playback."""
         self.logger.info('[RPC] wotabag.stop')
-        self._stop()
+        self._run_playback_control(self._stop)
 
     @public
     def test_pattern(self):
         """Display test color wipe patterns."""
         self.logger.info('[RPC] wotabag.test_pattern')
-        gevent.spawn_later(0, test_wipe, self.strip, clear=True)
+        # test_wipe() blocks in time.sleep(), so it must not run on the hub.
+        # Playback, set_color and stop cancel the wipe before using the strip.
+        self._cancel_wipe()
+        cancel = self._wipe_cancel = Event()
+        gevent.get_hub().threadpool.spawn(self._test_wipe, cancel)
 
 
 server_done = GEvent()
 
 
+class GeventSDPServerTransport(SDPServerTransport):
+    """SDP transport which waits for datagrams without blocking the gevent hub.
+
+    Datagrams arrive on the dbus/glib thread, which wakes up the waiting greenlet through an async watcher on the hub
+    of the thread that calls `receive_message()`.
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._watcher = None
+        self._wakeup = GEvent()
+
+    def _wait(self):
+        if self._watcher is None:
+            # the watcher stays started, since a send() to a stopped watcher is lost. Datagrams queued before it was
+            # started are picked up by the next process_pending()
+            self._watcher = gevent.get_hub().loop.async_(ref=False)
+            self._watcher.start(self._wakeup.set)
+            return
+        self._wakeup.wait()
+        self._wakeup.clear()
+
+    def _notify(self):
+        watcher = self._watcher
+        if watcher is not None:
+            watcher.send()
+
+
 class WotabagRPCServerGreenlets(RPCServerGreenlets):
 
     def serve_forever(self):
         while not server_done.is_set():
-            # wait for message then handle it
-            if self.transport.messages.empty():
-                gevent.sleep(0)
-            else:
-                self.receive_one_message()
+            # blocks until a message has been received, without blocking other greenlets
+            self.receive_one_message()
 
     def start(self):
         return gevent.spawn(self.serve_forever)
@@ -459,7 +696,8 @@ def gevent_main(wotabag, dispatcher, sdp_transport):
         logger.exception(e)
         raise e
     finally:
-        gevent.joinall(greenlets)
+        # the servers are waiting for their next message
+        gevent.killall(greenlets)
         logger.info("RPC server finished")
 
 
@@ -485,7 +723,7 @@ def main():
         dispatcher.register_instance(wotabag, 'wotabag.')
 
         # Configure BLE GATT server
-        sdp_transport = SDPServerTransport(queue_class=gevent.queue.Queue)
+        sdp_transport = GeventSDPServerTransport()
         ble.advertising_main(mainloop, bus, '')
         ble.gatt_server_main(mainloop, bus, '', sdp_transport)
 